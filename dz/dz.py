@@ -5,6 +5,7 @@
 # - DSL (Domain Specific Language, предметно-ориентированные языки)
 from lark import Lark, visitors
 import json
+import os
 
 grammar = r""" 
 start: value+
@@ -16,14 +17,19 @@ assign: NAME "->" value
 reference: "$[" NAME "]"
 const: "set" NAME "=" value
 dict: "{" (assign".")+ "}"
-value: NUM | dict |const| reference
+?value: NUM | dict |const| reference
 
 %ignore /\s/  
 %ignore /#[^\n]+/        
 """
 
+def _num(s):
+    # Целые литералы остаются int (мелкие int в CPython не аллоцируются заново), остальные — float
+    s = str(s)
+    return int(s) if ('.' not in s and 'e' not in s and 'E' not in s) else float(s)
+
 class T(visitors.Transformer):
-    NUM = float
+    NUM = staticmethod(_num)
     NAME = str
     def start(self, name):
         return name
@@ -31,13 +37,14 @@ class T(visitors.Transformer):
         return name
     def dict(self, name):
         return dict(name)
-    def value(self, name):
-        return name[0]
     def reference(self, name):
         return ("ref", name[0])
     def const(self, name):
         return ("const", name)
 
+# T не хранит состояния между разборами, поэтому один экземпляр переиспользуется
+_TRANSFORMER = T(visit_tokens=True)
+
 input = """
  #Это однострочный комментарий
 5
@@ -53,33 +60,55 @@ set tt = 555
 """
 
 def interp(tree, env):
-    if isinstance(tree, float):
-        return tree
-    if isinstance(tree, str):
-        return tree
-    if isinstance(tree, dict):
-        output = dict()
-        for k in tree:
-            output[k] = interp(tree[k], env)
-        return output
-    if isinstance(tree, list):
-        output = list()
-        for i in range(len(tree)):
-            output.append(interp(tree[i], env))
-        return output
-    if isinstance(tree, tuple):
-        if tree[0] == "const":
-            name = tree[1][0]
-            value = tree[1][1]
-            env[name] = value
-            return [name, value]
-        if tree[0] == "ref":
-            name = tree[1]
-            return env[name]
+    # Обход в обратном порядке (post-order) с явным стеком вместо рекурсии:
+    # глубокая вложенность не упирается в лимит рекурсии Python.
+    # Дочерние значения копятся в results, контейнер собирается из хвоста results.
+    results = []
+    stack = [(tree, False)]
+    while stack:
+        node, ready = stack.pop()
+        if isinstance(node, dict):
+            if ready:
+                first = len(results) - len(node)
+                output = dict(zip(node, results[first:]))
+                del results[first:]
+                results.append(output)
+            else:
+                stack.append((node, True))
+                for v in reversed(node.values()):
+                    stack.append((v, False))
+        elif isinstance(node, list):
+            if ready:
+                first = len(results) - len(node)
+                output = results[first:]
+                del results[first:]
+                results.append(output)
+            else:
+                stack.append((node, True))
+                for v in reversed(node):
+                    stack.append((v, False))
+        elif isinstance(node, tuple):
+            if node[0] == "const":
+                name, value = node[1]
+                env[name] = value
+                results.append([name, value])
+            elif node[0] == "ref":
+                results.append(env[node[1]])
+            else:
+                results.append(None)
+        elif isinstance(node, (int, float, str)):
+            results.append(node)
+        else:
+            results.append(None)
+    return results[0]
 
-parser = Lark(grammar)
+# LALR-таблицы сериализуются на диск и переиспользуются при следующих запусках
+# (Lark сам инвалидирует кэш при изменении грамматики или версии)
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".dz_lark.cache")
+# Transformer передаётся прямо в LALR-парсер: его методы вызываются при каждой
+# свёртке правила, и промежуточные Tree-узлы вообще не создаются
+parser = Lark(grammar, parser="lalr", lexer="contextual", cache=CACHE_PATH, transformer=_TRANSFORMER)
 tree = parser.parse(input)
-tree = T(visit_tokens=True).transform(tree)
 '''print(tree)
 json_ = json.dumps(tree)
 print(json_)'''
@@ -1,16 +1,74 @@
+import io
 import os
+import re
 import sys
 import argparse
+from contextlib import redirect_stdout
+from typing import Optional
 
-def exp(a: str) -> str:
-    """Простое раскрытие переменных окружения вида $VAR."""
-    for k, v in os.environ.items():
-        a = a.replace(f"${k}", v)
-    return a
+_VAR_RE = re.compile(r"\$([A-Za-z_][A-Za-z0-9_]*)")
+
+
+def exp(a: str, env: Optional[dict] = None) -> str:
+    """Простое раскрытие переменных окружения вида $VAR (неизвестные остаются как есть).
+
+    env — снимок окружения; по умолчанию берётся os.environ.
+    """
+    if env is None:
+        env = os.environ
+    return _VAR_RE.sub(lambda m: env.get(m.group(1), m.group(0)), a)
+
+
+def cmd_ls(args: list, params: dict, env: dict):
+    print("ls called with args:", args)
+
+
+def cmd_cd(args: list, params: dict, env: dict):
+    print("cd called with args:", args)
+
+
+def cmd_echo(args: list, params: dict, env: dict):
+    expanded = exp(" ".join(args), env) if args else ""
+    print(expanded)
+
+
+def cmd_dump(args: list, params: dict, env: dict):
+    for k, v in params.items():
+        print(f"{k}={v}")
+
+
+def cmd_unknown(args: list, params: dict, env: dict):
+    print("CommandNotFoundException")
+
+
+# Таблица команд, общая для REPL и стартового скрипта
+COMMANDS = {
+    "ls": cmd_ls,
+    "cd": cmd_cd,
+    "echo": cmd_echo,
+    "conf-dump": cmd_dump,
+}
+
+# Признак, который execute() возвращает на команду exit
+EXIT = object()
+
+
+def execute(line: str, params: dict, env: dict):
+    """Выполнить одну строку-команду; вернуть EXIT, если введена команда exit."""
+    b = line.split()
+    if not b:
+        return None
+    cmd = b[0]
+    if cmd == "exit":
+        return EXIT
+    handler = COMMANDS.get(cmd, cmd_unknown)
+    handler(b[1:], params, env)
+    return None
 
 
 def run_repl(vfs_name: str, params: dict):
     """Интерактивный REPL."""
+    env = dict(os.environ)  # снимок окружения на время сессии
     while True:
         try:
             a = input(f"{vfs_name}$ ")
@@ -18,32 +76,9 @@ def run_repl(vfs_name: str, params: dict):
             print()
             break
 
-        if not a.strip():
-            continue
-
-        b = a.split()
-        cmd = b[0]
-
-        if cmd == "exit":
+        if execute(a, params, env) is EXIT:
             break
 
-        elif cmd == "ls":
-            print("ls called with args:", b[1:])
-
-        elif cmd == "cd":
-            print("cd called with args:", b[1:])
-
-        elif cmd == "echo":
-            expanded = exp(" ".join(b[1:])) if len(b) > 1 else ""
-            print(expanded)
-
-        elif cmd == "conf-dump":
-            for k, v in params.items():
-                print(f"{k}={v}")
-
-        else:
-            print("CommandNotFoundException")
-
 
 def run_start_script(script_path: str, vfs_name: str, params: dict):
     """Выполнить стартовый скрипт построчно."""
@@ -52,50 +87,40 @@ def run_start_script(script_path: str, vfs_name: str, params: dict):
         return
 
     print(f"[INFO] Executing start script: {script_path}")
+    # Вывод скрипта копится в буфере и пишется в stdout одним вызовом,
+    # а не отдельной операцией записи на каждую строку
+    buf = io.StringIO()
+    try:
+        with redirect_stdout(buf):
+            _execute_script_file(script_path, vfs_name, params)
+    finally:
+        sys.stdout.write(buf.getvalue())
+        sys.stdout.flush()
+
+
+def _execute_script_file(script_path: str, vfs_name: str, params: dict):
+    env = dict(os.environ)  # снимок окружения на время выполнения скрипта
+    # Файл читается построчно по мере выполнения, а не целиком через readlines()
     try:
         with open(script_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
+            for idx, line in enumerate(f, start=1):
+                line = line.rstrip("\n")
+                if not line.strip():
+                    continue
+                if line.strip().startswith("#"):
+                    print(f"{vfs_name}$ {line}")  # показываем комментарий как ввод
+                    continue
+
+                print(f"{vfs_name}$ {line}")  # имитация пользовательского ввода
+                try:
+                    if execute(line, params, env) is EXIT:
+                        print("exit")
+                        return
+                except Exception as e:
+                    print(f"[ERROR] Exception at line {idx}: {e}")
+                    break
     except Exception as e:
         print(f"[ERROR] Cannot read script: {e}")
-        return
-
-    for idx, line in enumerate(lines, start=1):
-        line = line.rstrip("\n")
-        if not line.strip():
-            continue
-        if line.strip().startswith("#"):
-            print(f"{vfs_name}$ {line}")  # показываем комментарий как ввод
-            continue
-
-        print(f"{vfs_name}$ {line}")  # имитация пользовательского ввода
-        try:
-            b = line.split()
-            cmd = b[0]
-
-            if cmd == "exit":
-                print("exit")
-                return
-
-            elif cmd == "ls":
-                print("ls called with args:", b[1:])
-
-            elif cmd == "cd":
-                print("cd called with args:", b[1:])
-
-            elif cmd == "echo":
-                expanded = exp(" ".join(b[1:])) if len(b) > 1 else ""
-                print(expanded)
-
-            elif cmd == "conf-dump":
-                for k, v in params.items():
-                    print(f"{k}={v}")
-
-            else:
-                print("CommandNotFoundException")
-
-        except Exception as e:
-            print(f"[ERROR] Exception at line {idx}: {e}")
-            break
 
 
 def main():
@@ -5,19 +5,24 @@ maven_deps_cli.py
 Минимальный CLI для:
 - Получения параметров от пользователя (этап 1)
 - Загрузки POM из Maven-репозитория или локального файла и извлечения прямых зависимостей (этап 2)
+- Опционального обхода транзитивных зависимостей (POM загружаются параллельно)
 - Генерации Graphviz DOT и попытки рендеринга графа (этап 5)
 
 Не требует сторонних библиотек (только stdlib).
 """
 
 import argparse
+import io
 import sys
 import os
+import urllib.parse
 import urllib.request
 import urllib.error
 import xml.etree.ElementTree as ET
 import subprocess
-from typing import List, Tuple, Optional
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Optional
 
 # -------------------------
 # Утилиты и ошибки
@@ -43,6 +48,8 @@ def parse_args():
                         help="remote — загружать по HTTP из репозитория; local — искать файл в локальном репозитории (filesystem)")
     parser.add_argument("--render", action="store_true",
                         help="Попытаться отрендерить граф с помощью `dot` (если установлен). Сохранит PNG рядом с программой.")
+    parser.add_argument("--transitive", action="store_true",
+                        help="Обойти также транзитивные зависимости (POM загружаются параллельно)")
     parser.add_argument("--out-dot", default=None,
                         help="Путь для сохранения DOT-файла (если не указан — <artifact>-<version>.dot)")
     return parser.parse_args()
@@ -55,6 +62,7 @@ def print_config_and_validate(args):
         "repo": args.repo,
         "mode": args.mode,
         "render": str(args.render),
+        "transitive": str(args.transitive),
         "out_dot": args.out_dot or "(auto)"
     }
     print("=== Конфигурация (ключ=значение) ===")
@@ -85,103 +93,281 @@ def build_pom_path_remote(repo_url: str, group_id: str, artifact_id: str, versio
     else:
         return f"{repo_url}/{group_path}/{artifact_id}/{version}/{pom_name}"
 
-def get_pom_remote(url: str) -> str:
+# Локальный кэш POM, скачанных по HTTP:
+# <репозиторий>/<groupId как путь>/<artifactId>/<version>/<artifactId>-<version>.pom
+POM_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "konfupr", "poms")
+
+def pom_cache_path(repo_url: str, group_id: str, artifact_id: str, version: str) -> Optional[str]:
+    """
+    Путь к POM в кэше или None, если кэшировать нельзя: -SNAPSHOT версии меняются
+    на сервере. Хост и путь репозитория входят в ключ, чтобы POM разных репозиториев не смешивались.
+    Координаты под --transitive берутся из скачанных POM, поэтому компоненты пути
+    проверяются: POM не должен заставить инструмент писать файлы вне POM_CACHE_DIR.
+    """
+    if version.endswith("-SNAPSHOT"):
+        return None
+    components = group_id.split(".") + [artifact_id, version]
+    if not all(_safe_path_component(c) for c in components):
+        return None
+    parts = urllib.parse.urlsplit(repo_url)
+    repo_key = f"{parts.netloc}{parts.path}".strip("/").replace(":", "_").replace("/", "_")
+    path = os.path.join(POM_CACHE_DIR, repo_key, *group_id.split("."), artifact_id, version, f"{artifact_id}-{version}.pom")
+    cache_root = os.path.realpath(POM_CACHE_DIR)
+    if os.path.commonpath([cache_root, os.path.realpath(path)]) != cache_root:
+        return None
+    return path
+
+def _safe_path_component(c: str) -> bool:
+    return bool(c) and "/" not in c and os.sep not in c and ".." not in c
+
+def get_pom_remote(url: str, cache_path: Optional[str] = None):
+    """
+    Открывает POM по HTTP и возвращает ответ как файловый объект (закрывает вызывающий).
+    Тело не читается целиком: XML-парсер затем берёт данные прямо из сокета.
+    Если указан cache_path, POM сначала ищется там; скачанный POM сохраняется туда
+    (через временный файл и os.replace, чтобы в кэше не оставалось недокачанных файлов).
+    """
+    if cache_path and os.path.isfile(cache_path):
+        try:
+            return open(cache_path, "rb")
+        except OSError as ex:
+            eprint(f"Не удалось прочитать POM из кэша ({ex}), продолжаем без кэша.")
+            return get_pom_remote(url)
     try:
-        with urllib.request.urlopen(url) as resp:
-            if resp.status != 200:
-                raise CLIError(f"HTTP {resp.status} при попытке получить POM по {url}")
-            data = resp.read()
-            try:
-                text = data.decode("utf-8")
-            except UnicodeDecodeError:
-                text = data.decode("latin1")
-            return text
+        resp = urllib.request.urlopen(url)
     except urllib.error.HTTPError as he:
         raise CLIError(f"HTTPError: {he.code} {he.reason} for {url}")
     except urllib.error.URLError as ue:
         raise CLIError(f"URLError: {ue.reason} for {url}")
     except Exception as ex:
         raise CLIError(f"Ошибка при загрузке POM: {ex}")
+    if resp.status != 200:
+        resp.close()
+        raise CLIError(f"HTTP {resp.status} при попытке получить POM по {url}")
+    if not cache_path:
+        return resp
+
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    except OSError as ex:
+        eprint(f"Не удалось создать каталог кэша POM ({ex}), продолжаем без кэша.")
+        return resp
+    try:
+        tmp = tempfile.NamedTemporaryFile(dir=os.path.dirname(cache_path), suffix=".tmp", delete=False)
+    except OSError as ex:
+        eprint(f"Не удалось записать POM в кэш ({ex}), продолжаем без кэша.")
+        return resp
+    with resp:
+        try:
+            with tmp:
+                while True:
+                    # ошибки сети — фатальны для этого POM, ошибки диска — только для кэша
+                    try:
+                        chunk = resp.read(64 * 1024)
+                    except Exception as ex:
+                        raise CLIError(f"Ошибка при загрузке POM: {ex}")
+                    if not chunk:
+                        break
+                    tmp.write(chunk)
+            os.replace(tmp.name, cache_path)
+        except OSError as ex:
+            _remove_quietly(tmp.name)
+            eprint(f"Не удалось записать POM в кэш ({ex}), продолжаем без кэша.")
+            # часть ответа уже прочитана — загружаем POM заново, не сохраняя его
+            return get_pom_remote(url)
+        except CLIError:
+            _remove_quietly(tmp.name)
+            raise
+    try:
+        return open(cache_path, "rb")
+    except OSError as ex:
+        eprint(f"Не удалось прочитать POM из кэша ({ex}), продолжаем без кэша.")
+        return get_pom_remote(url)
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
 
 def get_pom_local(repo_dir: str, group_id: str, artifact_id: str, version: str) -> str:
+    """Возвращает путь к POM-файлу в локальном репозитории."""
     group_path = group_id.replace(".", "/")
     pom_path = os.path.join(repo_dir, group_path, artifact_id, version, f"{artifact_id}-{version}.pom")
     if not os.path.isfile(pom_path):
         raise CLIError(f"POM-файл не найден по пути: {pom_path}")
-    try:
-        with open(pom_path, "r", encoding="utf-8") as f:
-            return f.read()
-    except Exception as ex:
-        raise CLIError(f"Ошибка чтения локального POM: {ex}")
+    return pom_path
 
 # -------------------------
 # Разбор POM и извлечение прямых зависимостей (Этап 2.2-4)
 # -------------------------
-def extract_direct_dependencies(pom_xml: str) -> List[Tuple[str,str,str]]:
+def extract_direct_dependencies(source) -> List[Tuple[str,str,str]]:
     """
     Возвращает список прямых зависимостей в формате [(groupId, artifactId, version_or_none), ...]
     Не выполняется резолвинг переменных POM (<${...}>) и не обрабатывает профили/parent inheritance полноценно.
     Это простая, но рабочая реализация для большинства POM.
+    source — путь к файлу или файловый объект (например, HTTP-ответ). POM разбирается потоково
+    через iterparse: в памяти держится только текущая <dependency>, остальные узлы очищаются.
     """
+    deps = []
+    tags = None     # полные имена тегов с namespace корня, строятся один раз
+    fields = None   # полный тег поля <dependency> -> его имя
+    path = []       # теги открытых элементов от корня до текущего
     try:
-        root = ET.fromstring(pom_xml)
+        for event, elem in ET.iterparse(source, events=("start", "end")):
+            if event == "start":
+                if tags is None:
+                    # Обычно POM использует namespace: http://maven.apache.org/POM/4.0.0
+                    ns = elem.tag[:elem.tag.index("}") + 1] if elem.tag.startswith("{") else ""
+                    tags = {k: ns + k for k in ("dependency", "dependencies")}
+                    fields = {ns + k: k for k in ("groupId", "artifactId", "version", "scope", "optional")}
+                path.append(elem.tag)
+                continue
+
+            path.pop()
+            # Прямые зависимости — только <project>/<dependencies>/<dependency>; секции
+            # <dependencyManagement>, <build>/<plugins>/.../<dependencies> и <profiles> пропускаются
+            if len(path) == 2 and elem.tag == tags["dependency"] and path[1] == tags["dependencies"]:
+                # один проход по дочерним элементам вместо findtext на каждое поле
+                values = {}
+                for child in elem:
+                    name = fields.get(child.tag)
+                    if name is not None:
+                        values.setdefault(name, child.text)
+                gid = values.get("groupId")
+                aid = values.get("artifactId")
+                ver = values.get("version")
+                scope = values.get("scope")
+                optional = values.get("optional")
+                # Игнорируем зависимости с scope 'test' или optional='true' — это можно изменить при необходимости
+                if gid and aid:
+                    deps.append((gid.strip(), aid.strip(), (ver.strip() if ver and ver.strip() else None), (scope.strip() if scope else None), (optional.strip() if optional else None)))
+                elem.clear()
+            elif not (len(path) > 2 and path[1] == tags["dependencies"] and path[2] == tags["dependency"]):
+                # поля <dependency> нужны до её закрытия, остальное можно сразу очистить
+                elem.clear()
     except ET.ParseError as pe:
         raise CLIError(f"XML Parse Error в POM: {pe}")
+    except OSError as ex:
+        raise CLIError(f"Ошибка чтения POM: {ex}")
+    return deps
 
-    # Обычно POM использует namespace: http://maven.apache.org/POM/4.0.0
-    ns = {}
-    if root.tag.startswith("{"):
-        uri = root.tag.split("}")[0].strip("{")
-        ns["m"] = uri
-        dep_xpath = ".//m:dependencies/m:dependency"
-    else:
-        dep_xpath = ".//dependencies/dependency"
+# -------------------------
+# Транзитивные зависимости
+# -------------------------
+Coord = Tuple[str, str, str]
+Dep = Tuple[str, str, Optional[str], Optional[str], Optional[str]]
 
-    deps = []
-    for dep in root.findall(dep_xpath, ns):
-        gid = dep.findtext("m:groupId" if ns else "groupId", default=None, namespaces=ns)
-        aid = dep.findtext("m:artifactId" if ns else "artifactId", default=None, namespaces=ns)
-        ver = dep.findtext("m:version" if ns else "version", default=None, namespaces=ns)
-        scope = dep.findtext("m:scope" if ns else "scope", default=None, namespaces=ns)
-        optional = dep.findtext("m:optional" if ns else "optional", default=None, namespaces=ns)
-        # Игнорируем зависимости с scope 'test' или optional='true' — это можно изменить при необходимости
-        if gid and aid:
-            deps.append((gid.strip(), aid.strip(), (ver.strip() if ver and ver.strip() else None), (scope.strip() if scope else None), (optional.strip() if optional else None)))
+# Уже разобранные POM: (groupId, artifactId, version) -> прямые зависимости
+_deps_cache: Dict[Coord, List[Dep]] = {}
+
+def fetch_pom_deps(coord: Coord, repo: str, mode: str) -> List[Dep]:
+    """Загружает POM артефакта (remote или local) и возвращает его прямые зависимости."""
+    if coord in _deps_cache:
+        return _deps_cache[coord]
+    group_id, artifact_id, version = coord
+    if mode == "remote":
+        url = build_pom_path_remote(repo, group_id, artifact_id, version)
+        cache_path = pom_cache_path(repo, group_id, artifact_id, version)
+        from_cache = cache_path is not None and os.path.isfile(cache_path)
+        try:
+            with get_pom_remote(url, cache_path) as pom_source:
+                deps = extract_direct_dependencies(pom_source)
+        except CLIError:
+            if cache_path is None:
+                raise
+            # испорченный POM (HTML прокси, обрезанный ответ) не должен оставаться в кэше
+            _remove_quietly(cache_path)
+            if not from_cache:
+                raise
+            # битой была старая запись кэша — загружаем POM заново
+            with get_pom_remote(url, cache_path) as pom_source:
+                deps = extract_direct_dependencies(pom_source)
+    else:
+        deps = extract_direct_dependencies(get_pom_local(repo, group_id, artifact_id, version))
+    _deps_cache[coord] = deps
     return deps
 
+def _followed(deps: List[Dep]) -> List[Coord]:
+    """
+    Зависимости, POM которых нужно загрузить дальше. Как и Maven, не идём в test/provided
+    и optional; версии без значения или с ${...} разрешить нельзя — такие пропускаем.
+    """
+    coords = []
+    for gid, aid, ver, scope, optional in deps:
+        if not ver or "${" in ver:
+            continue
+        if scope in ("test", "provided") or (optional and optional.lower() == "true"):
+            continue
+        coords.append((gid, aid, ver))
+    return coords
+
+def resolve_transitive(root: Coord, direct: List[Dep], repo: str, mode: str, max_workers: int = 16) -> Dict[Coord, List[Dep]]:
+    """
+    Обход в ширину по графу зависимостей. Все POM очередного уровня загружаются
+    параллельно в пуле потоков: работа упирается в сетевые задержки, а не в CPU.
+    Возвращает {артефакт: его прямые зависимости}; POM, которые не удалось получить,
+    дают пустой список и предупреждение в stderr.
+    """
+    graph: Dict[Coord, List[Dep]] = {root: direct}
+    frontier = list(dict.fromkeys(c for c in _followed(direct) if c not in graph))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while frontier:
+            futures = [pool.submit(fetch_pom_deps, c, repo, mode) for c in frontier]
+            for coord, fut in zip(frontier, futures):
+                try:
+                    graph[coord] = fut.result()
+                except CLIError as e:
+                    eprint(f"Предупреждение: {':'.join(coord)}: {e}")
+                    graph[coord] = []
+            frontier = list(dict.fromkeys(
+                c for coord in frontier for c in _followed(graph[coord]) if c not in graph))
+    return graph
+
 # -------------------------
 # Graphviz DOT генерация (Этап 5.1)
 # -------------------------
-def generate_dot(root_pkg: str, root_ver: str, dependencies: List[Tuple[str,str,Optional[str],Optional[str],Optional[str]]]) -> str:
-    lines = []
-    lines.append('digraph dependencies {')
-    lines.append('  rankdir=LR;')
+# Экранирование для строк DOT в кавычках: одна таблица для str.translate
+_DOT_ESCAPE = str.maketrans({'"': '\\"', "\\": "\\\\"})
+
+def _dot_id(label: str) -> str:
+    return f'"{label.translate(_DOT_ESCAPE)}"'
+
+def generate_dot(root_pkg: str, root_ver: str, dependencies: List[Dep],
+                 transitive: Optional[Dict[Coord, List[Dep]]] = None) -> str:
+    buf = io.StringIO()
+    w = buf.write
+    w('digraph dependencies {\n')
+    w('  rankdir=LR;\n')
     # root node
-    root_node = f"\"{root_pkg}:{root_ver}\""
-    lines.append(f"  {root_node} [shape=box, style=filled, fillcolor=lightgrey];")
+    root_node = _dot_id(f"{root_pkg}:{root_ver}")
+    w(f"  {root_node} [shape=box, style=filled, fillcolor=lightgrey];\n")
+    # рёбра: от корня к прямым зависимостям, затем (если есть) от каждого артефакта к его зависимостям
+    sources = [(root_node, dependencies)]
+    if transitive:
+        root_coord = tuple(root_pkg.split(":", 1)) + (root_ver,)
+        sources += [(_dot_id(":".join(coord)), deps) for coord, deps in transitive.items() if coord != root_coord]
+    declared = {root_node}
     # deps
-    for gid, aid, ver, scope, optional in dependencies:
-        label = f"{gid}:{aid}"
-        if ver:
-            label += f":{ver}"
-        node = f"\"{label}\""
-        lines.append(f"  {node} [shape=ellipse];")
-        # maybe annotate label with scope
-        edge_attrs = []
-        if scope:
-            edge_attrs.append(f"label=\"{scope}\"")
-        if optional and optional.lower() == "true":
-            edge_attrs.append("style=dashed")
-        attrs = f" [{', '.join(edge_attrs)}]" if edge_attrs else ""
-        lines.append(f"  {root_node} -> {node}{attrs};")
-    lines.append("}")
-    return "\n".join(lines)
-
-def try_render_dot(dot_text: str, out_dot_path: str, out_png_path: str) -> None:
-    # Сохраняем DOT
-    with open(out_dot_path, "w", encoding="utf-8") as f:
-        f.write(dot_text)
-    # пытаемся запустить dot
+    for parent, deps in sources:
+        for gid, aid, ver, scope, optional in deps:
+            node = _dot_id(f"{gid}:{aid}:{ver}" if ver else f"{gid}:{aid}")
+            if node not in declared:
+                declared.add(node)
+                w(f"  {node} [shape=ellipse];\n")
+            # maybe annotate label with scope
+            edge_attrs = []
+            if scope:
+                edge_attrs.append(f"label={_dot_id(scope)}")
+            if optional and optional.lower() == "true":
+                edge_attrs.append("style=dashed")
+            attrs = f" [{', '.join(edge_attrs)}]" if edge_attrs else ""
+            w(f"  {parent} -> {node}{attrs};\n")
+    w("}")
+    return buf.getvalue()
+
+def try_render_dot(out_dot_path: str, out_png_path: str) -> None:
+    # DOT-файл уже сохранён в run(), здесь только запускаем dot
     try:
         subprocess.run(["dot", "-Tpng", out_dot_path, "-o", out_png_path], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         print(f"Graphviz PNG сгенерирован: {out_png_path}")
@@ -204,14 +390,13 @@ def run():
         if args.mode == "remote":
             pom_url = build_pom_path_remote(args.repo, group_id, artifact_id, version)
             print(f"Загружаем POM по URL: {pom_url}")
-            pom_xml = get_pom_remote(pom_url)
         else:
             print(f"Ищем POM в локальном репозитории: {args.repo}")
-            pom_xml = get_pom_local(args.repo, group_id, artifact_id, version)
+        # извлечь прямые зависимости (Этап 2.3-4), разбирая POM по мере загрузки
+        root_coord = (group_id, artifact_id, version)
+        deps = fetch_pom_deps(root_coord, args.repo, args.mode)
 
-        # извлечь прямые зависимости (Этап 2.3-4)
         print("\n=== Прямые зависимости ===")
-        deps = extract_direct_dependencies(pom_xml)
         if not deps:
             print("Прямых зависимостей не найдено.")
         else:
@@ -225,23 +410,34 @@ def run():
                     s += f" [optional={optional}]"
                 print(s)
 
+        graph = None
+        if args.transitive:
+            print("\n=== Транзитивные зависимости ===")
+            graph = resolve_transitive(root_coord, deps, args.repo, args.mode)
+            for coord, coord_deps in graph.items():
+                if coord == root_coord:
+                    continue
+                print(f"{':'.join(coord)} ({len(coord_deps)})")
+                for gid, aid, ver, scope, optional in coord_deps:
+                    print(f"  {gid}:{aid}" + (f":{ver}" if ver else ""))
+
         # Graphviz (Этап 5)
         print("\n=== Генерация Graphviz (DOT) ===")
         root_pkg = f"{group_id}:{artifact_id}"
-        dot_text = generate_dot(root_pkg, version, deps)
+        dot_text = generate_dot(root_pkg, version, deps, graph)
         out_dot_path = args.out_dot if args.out_dot else f"{artifact_id}-{version}.dot"
         out_png_path = out_dot_path.rsplit(".",1)[0] + ".png"
         with open(out_dot_path, "w", encoding="utf-8") as f:
             f.write(dot_text)
         print(f"DOT файл сохранён: {out_dot_path}")
         if args.render:
-            try_render_dot(dot_text, out_dot_path, out_png_path)
+            try_render_dot(out_dot_path, out_png_path)
         else:
             print("Рендеринг не запрошен (--render), .dot можно открыть в Graphviz или онлайн-рендерерах.")
 
         print("\n=== Готово ===")
         # дополнительные объяснения про ограничения
-        print("\n[Примечание] Этот инструмент извлекает только прямые зависимости из POM (section <dependencies>).")
+        print("\n[Примечание] Без --transitive этот инструмент извлекает только прямые зависимости из POM (section <dependencies>).")
         print("Он не выполняет резолвинг переменных вида ${...}, не учитывает parent/dependencyManagement/профили/байнд-плагины.")
         print("Поэтому результаты могут отличаться от вывода `mvn dependency:tree`, который резолвит транзитивные зависимости, свойства и плагины.")
     except CLIError as e: